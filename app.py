@@ -1,13 +1,32 @@
 import streamlit as st
+import streamlit.components.v1 as components
 import pandas as pd
-import folium
-from streamlit_folium import st_folium
-from PIL import Image
-import io 
-import hashlib 
-import random 
+import numpy as np
+# folium and PIL are imported lazily inside create_folium_map/analyze_road_image
+# so cold start does not pay for them before the first paint.
+import contextlib
+import hashlib
+import html
+import random
+import re
+import struct
+import time
+import zlib
+try:
+    import xxhash  # SIMD-accelerated content hashing for upload de-duplication
+except ImportError:
+    xxhash = None
+try:
+    import orjson  # C-implemented JSON parsing for the weather payload
+except ImportError:
+    orjson = None
+import threading
 from typing import Dict, Any, List
-import requests 
+from concurrent.futures import ThreadPoolExecutor
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 # --- CONFIGURATION (MUST be the first Streamlit call) ---
 st.set_page_config(
@@ -19,6 +38,57 @@ st.set_page_config(
 # --- NEW: API Configuration (You MUST replace this placeholder key) ---
 WEATHER_API_KEY = "YOUR_ACTUAL_OPENWEATHERMAP_API_KEY_HERE" # **<-- FIXED: Replaced non-functional key**
 WEATHER_API_URL = "https://api.openweathermap.org/data/2.5/weather"
+
+# Shared session so repeated fetches reuse the TLS connection instead of paying
+# a fresh TCP+TLS handshake per click, with a bounded retry for flaky responses.
+SESSION = requests.Session()
+SESSION.mount("https://", HTTPAdapter(
+    pool_connections=4,
+    pool_maxsize=8,
+    max_retries=Retry(total=2, backoff_factor=0.3, status_forcelist=[500, 502, 503, 504])
+))
+
+# Static part of the query string, merged with the location at call time.
+_WEATHER_PARAMS_BASE = {'appid': WEATHER_API_KEY, 'units': 'metric'}
+
+# How long identical location lookups are served from memory.
+WEATHER_CACHE_TTL_SECONDS = 600
+
+class WeatherAPIError(Exception):
+    """Raised for non-200 weather API responses, carrying the status code."""
+    def __init__(self, status_code: int, message: str, retry_after: str = None):
+        super().__init__(message)
+        self.status_code = status_code
+        self.message = message
+        self.retry_after = retry_after  # raw Retry-After header, if any
+
+@st.cache_data(ttl=WEATHER_CACHE_TTL_SECONDS, show_spinner=False)
+def fetch_weather(city: str) -> dict:
+    """Fetches the current weather for a city, cached per location.
+
+    Raises WeatherAPIError on any non-200 status so error responses are never
+    cached - only the successful payload is returned from the cached body.
+    """
+    response = SESSION.get(
+        WEATHER_API_URL,
+        params={'q': city, **_WEATHER_PARAMS_BASE},
+        timeout=(3, 5)  # (connect, read) so a stalled handshake fails fast
+    )
+    if response.status_code != 200:
+        try:
+            api_message = response.json().get('message', '')
+        except Exception:
+            api_message = ''
+        raise WeatherAPIError(response.status_code, api_message,
+                              retry_after=response.headers.get('Retry-After'))
+    if orjson is not None:
+        return orjson.loads(response.content)
+    return response.json()
+
+@st.cache_resource
+def _executor() -> ThreadPoolExecutor:
+    """Shared worker pool, created once per server process (not per rerun)."""
+    return ThreadPoolExecutor(max_workers=4)
 # --- END NEW CONFIG ---
 
 
@@ -203,7 +273,38 @@ h3 {
     border-radius: 8px;
 }
 
-/* 7. KNOWLEDGE BASE TRANSPARENCY - Data Integrity Container: Dark, Impressive Theme */
+/* 7. KPI Cards (rendered in one HTML block together with the header banner) */
+.kpi-row {
+    display: flex;
+    gap: 20px;
+    margin-bottom: 10px;
+}
+.kpi {
+    flex: 1;
+    background-color: var(--background-container);
+    border-radius: 10px;
+    padding: 15px 20px;
+    box-shadow: 0 4px 12px rgba(0, 0, 0, 0.08);
+}
+.kpi-label {
+    display: block;
+    font-size: 0.9rem;
+    color: #555;
+}
+.kpi-value {
+    display: block;
+    font-size: 2rem;
+    font-weight: 800;
+    color: var(--primary-purple);
+}
+.kpi-delta {
+    font-size: 0.85rem;
+    font-weight: 600;
+}
+.kpi-delta.up { color: #28A745; }
+.kpi-delta.down { color: #DC3545; }
+
+/* 8. KNOWLEDGE BASE TRANSPARENCY - Data Integrity Container: Dark, Impressive Theme */
 .data-integrity-container {
     /* Changed to a dark, professional gradient */
     background: linear-gradient(135deg, #4A235A 0%, var(--primary-purple) 100%); 
@@ -232,30 +333,68 @@ h3 {
 
 </style>
 """
-st.markdown(CUSTOM_CSS, unsafe_allow_html=True)
+# Minified once at import time so every rerun ships a much smaller payload.
+CUSTOM_CSS = re.sub(r'\s+', ' ', re.sub(r'/\*.*?\*/', '', CUSTOM_CSS, flags=re.S))
+
+if hasattr(st, 'html'):
+    # st.html bypasses the react-markdown pipeline entirely (Streamlit >= 1.33)
+    st.html(CUSTOM_CSS)
+else:
+    st.markdown(CUSTOM_CSS, unsafe_allow_html=True)
 
 
 # --- INITIALIZE SESSION STATE ---
+# The action plan is held as a DataFrame natively so rendering skips the
+# per-rerun list-of-dicts -> DataFrame conversion. Categories are declared up
+# front to cover every value the generators and the editor can produce.
+_PLAN_DTYPES = {
+    'Source': pd.CategoricalDtype(['Map', 'RAG', 'Vision AI']),
+    'Risk': pd.CategoricalDtype(['Low', 'Low/Medium', 'Medium', 'Medium/High', 'High', 'Critical'], ordered=True),
+    'Status': pd.CategoricalDtype(['To Do', 'In Progress', 'Completed', 'Deferred']),
+}
+
+# Static chart data, built once at import instead of on every rerun. These are
+# hardcoded literals today; swap in @st.cache_data loaders if they ever become
+# dynamically sourced.
+_STACKED_DATA = pd.DataFrame({
+    'Period': ['Q3 2023 (Baseline)', 'Q3 2024 (Current)'],
+    'Fatalities': [40, 38],
+    'Serious Injuries': [155, 170],
+    'Minor Injuries': [188, 244]
+}).set_index('Period')  # Set Period as index for bar chart categories.
+_COVERAGE_DATA = pd.DataFrame({
+    'Source': ['MoRTH Reports', 'IRC Codes', 'NCRB Data'],
+    'Count': [450, 35, 15]
+})
+_CONFIDENCE_MATCH_DF = pd.DataFrame({
+    'Confidence (77-100%)': [0.70, 0.74, 0.76, 0.80, 0.84, 0.88, 0.90, 0.92, 0.96, 1.00],
+    'Frequency': [100, 80, 100, 120, 150, 100, 180, 220, 400, 50]
+})
+
 if 'action_plan' not in st.session_state:
-    st.session_state['action_plan'] = []
-    st.session_state['action_plan'].append(
-    {
-        "ID": "MORT-001",
-        "Source": "Map",
-        "Issue": "Signal Jumping at Bangalore Ring Road",
-        "Intervention": "Full Signal Optimization & Rumble Strips",
-        "Risk": "Critical",
-        "Status": "To Do"
-        })
-    st.session_state['action_plan'].append(
-    {
-        "ID": "IRC-002",
-        "Source": "RAG",
-        "Issue": "Faded markings on NH-19 as per audit report",
-        "Intervention": "Thermoplastic re-painting of shoulder lines (IRC:67)",
-        "Risk": "High",
-        "Status": "In Progress"
-    })
+    st.session_state['action_plan'] = pd.DataFrame([
+        {
+            "ID": "MORT-001",
+            "Source": "Map",
+            "Issue": "Signal Jumping at Bangalore Ring Road",
+            "Intervention": "Full Signal Optimization & Rumble Strips",
+            "Risk": "Critical",
+            "Status": "To Do"
+        },
+        {
+            "ID": "IRC-002",
+            "Source": "RAG",
+            "Issue": "Faded markings on NH-19 as per audit report",
+            "Intervention": "Thermoplastic re-painting of shoulder lines (IRC:67)",
+            "Risk": "High",
+            "Status": "In Progress"
+        },
+    ]).astype(_PLAN_DTYPES)
+
+if 'action_plan_issues' not in st.session_state:
+    # Parallel set of Issue strings so duplicate checks are O(1) instead of a
+    # linear scan of the whole plan on every RAG/vision insert.
+    st.session_state['action_plan_issues'] = set(st.session_state['action_plan']['Issue'])
 
 # <--- 2. NEW: Initialize weather session state --->
 if 'current_weather' not in st.session_state:
@@ -265,23 +404,144 @@ if 'last_fetch_status' not in st.session_state: # <--- ADDED FOR PERSISTENCE
 # <--- END NEW --->
 
 
+# --- HELPER FUNCTION: APPEND A TASK TO THE PLAN ---
+def _append_plan_task(new_task: Dict[str, str]) -> None:
+    """Appends a task unless its Issue is already tracked.
+
+    Concatenating a one-row frame typed with _PLAN_DTYPES keeps the declared
+    categoricals intact (a .loc enlargement casts them back to object), and
+    ignore_index keeps labels unique after editor deletions so a new task can
+    never silently overwrite an existing row.
+    """
+    if new_task['Issue'] in st.session_state['action_plan_issues']:
+        return
+    row = pd.DataFrame([new_task]).astype(_PLAN_DTYPES)
+    st.session_state['action_plan'] = pd.concat(
+        [st.session_state['action_plan'], row], ignore_index=True
+    )
+    st.session_state['action_plan_issues'].add(new_task['Issue'])
+
 # --- HELPER FUNCTION: CLEAR COMPLETED TASKS ---
 def clear_completed_tasks():
     """Filters the action plan to remove tasks marked as 'Completed'."""
-    initial_count = len(st.session_state['action_plan'])
-    st.session_state['action_plan'] = [
-        task for task in st.session_state['action_plan'] if task['Status'] != 'Completed'
-    ]
-    removed_count = initial_count - len(st.session_state['action_plan'])
+    plan_df = st.session_state['action_plan']
+    initial_count = len(plan_df)
+    plan_df = plan_df[plan_df['Status'] != 'Completed'].reset_index(drop=True)
+    st.session_state['action_plan'] = plan_df
+    st.session_state['action_plan_issues'] = set(plan_df['Issue'])
+    removed_count = initial_count - len(plan_df)
     if removed_count > 0:
         st.success(f"{removed_count} completed tasks cleared from the plan.")
     else:
         st.info("No completed tasks to clear.")
 
+# Prebuilt translation tables: str.translate strips markdown/punctuation in a
+# single C-level pass instead of chained .replace() allocations.
+_STRIP_BOLD_AND_DOTS = {ord('*'): None, ord('.'): None}
+_STRIP_BOLD = {ord('*'): None}
+_STRIP_DOTS = {ord('.'): None}
+
+# --- RAG RESPONSE TABLE ---
+# Keyword -> response-key rules, compiled once at import. get_rag_answer scans
+# the query against this table and dispatches through RAG_RESPONSES instead of
+# re-testing an if/elif cascade of substring checks.
+RAG_RULES = (
+    (("zebra", "pedestrian", "crossing"), "pedestrian"),
+    (("speed", "limit", "enforce"), "speed"),
+    (("shoulder", "width", "geometry"), "shoulder"),
+)
+
+# One compiled scan for the low-visibility weather keywords instead of three
+# separate substring tests (each of which re-lowered the string).
+_FOG_RE = re.compile(r'fog|mist|haze')
+
+# Static response content lives at module scope as immutable tuples/templates;
+# the builders only interpolate the per-call confidence (and, for the general
+# branch, the chosen element) instead of re-allocating the large literals.
+_INTERV_PED = (
+    "Implement a clear **Zebra Crossing** (IRC:35/IRC:67) with high-visibility thermoplastic paint.",
+    "Ensure a minimum of **2.5m clear visibility** distance for approaching vehicles.",
+    "Add 'Pedestrian Ahead' warning signs with flashing beacons."
+)
+_EVID_PED_TPL = (
+    "IRC:67 mandates specific colors and widths for crossings. IRC:35 details pedestrian facilities and safe practices. "
+    "MoRTH data suggests high fatality rates at un-marked crossings. **Confidence: {c}**"
+)
+_ISSUE_PED = "Un-marked/Faded Pedestrian Crossing (IRC:35/IRC:67 violation)"
+
+_INTERV_SPD = (
+    "Install **Rumble Strips** and clear speed limit signage (IRC:SP-50) on approach to high-risk zones.",
+    "Deploy Automated Speed Enforcement (ASE) cameras for continuous monitoring.",
+    "Conduct a **3-day speed study** to reassess the zone's design speed."
+)
+_EVID_SPD_TPL = (
+    "IRC:SP-50 provides guidelines for speed breakers and zones. MoRTH circulars recommend ASE for accident blackspots. "
+    "Speeding remains the leading cause of fatal accidents in India. **Confidence: {c}**"
+)
+_ISSUE_SPD = "Inadequate speed control measures (IRC:SP-50 non-compliance)"
+
+_INTERV_SHD = (
+    "Verify and reconstruct shoulder width to meet **IRC:69 standards** (typically 1.5m to 2.5m paved shoulder on NH/SH).",
+    "Maintain clear recovery zones beyond the shoulder to minimize roll-over risk.",
+    "Add edge line markings (thermoplastic paint) with minimum 150mm width."
+)
+_EVID_SHD_TPL = (
+    "IRC:69 specifies geometric design standards, including shoulder dimensions and side slopes. "
+    "Adequate shoulders reduce run-off-road accidents by providing recovery space. "
+    "Poor geometry contributes to lane departure accidents. **Confidence: {c}**"
+)
+_ISSUE_SHD = "Shoulder width deficiency or lack of clear recovery zone (IRC:69 violation)"
+
+_GENERAL_ELEMENTS = ("night-time glare mitigation", "wildlife crossings design", "bus bay design compliance", "toll plaza safety procedures")
+_INTERV_GEN = (
+    "Analyze the specific IRC code for **{e}** (IRC:SP-52/IRC:81/IRC:103).",
+    "Review the last quarterly safety audit report for this general area.",
+    "Conduct a full semantic search on the query to pinpoint the exact IRC clause."
+)
+_EVID_GEN_TPL = (
+    "The evidence base contains specific sections on **{e}** mitigation. A full semantic search across all indexed MoRTH/IRC documents is required to provide maximum precision. "
+    "General safety compliance score check initiated. **Confidence: {c}**"
+)
+
+_INTERV_FOG = (
+    "**IMMEDIATE FOG INTERVENTION:** Install/verify high-power, retro-reflective **Cat's Eye** road studs for lane delineation (IRC:67 compliant).",
+    "Deploy highly visible **Variable Message Signs (VMS)** warning of low visibility, as per MoRTH guidelines.",
+    "Enforce a temporary speed limit reduction (e.g., 40%) when visibility drops below 50 meters, citing IRC:SP-50."
+)
+_EVID_FOG_TPL = (
+    "**CONTEXT-AWARE RECOMMENDATION (Weather: {w}):** IRC:67 mandates retro-reflective elements for night-time/low-visibility driving. "
+    "Fog-related accidents are often high-severity pile-ups, hence the critical risk assessment. **Confidence: {c}**"
+)
+
+def _rag_response_pedestrian(confidence: float, seed: int):
+    return "High", _INTERV_PED, _EVID_PED_TPL.format(c=confidence), _ISSUE_PED
+
+def _rag_response_speed(confidence: float, seed: int):
+    return "Medium-to-High", _INTERV_SPD, _EVID_SPD_TPL.format(c=confidence), _ISSUE_SPD
+
+def _rag_response_shoulder(confidence: float, seed: int):
+    return "Medium", _INTERV_SHD, _EVID_SHD_TPL.format(c=confidence), _ISSUE_SHD
+
+def _rag_response_general(confidence: float, seed: int):
+    random_element = _GENERAL_ELEMENTS[seed % len(_GENERAL_ELEMENTS)]
+    intervention = (_INTERV_GEN[0].format(e=random_element),) + _INTERV_GEN[1:]
+    evidence = _EVID_GEN_TPL.format(e=random_element, c=confidence)
+    issue = f"General query about {random_element} standards."
+    return "Low-to-Medium", intervention, evidence, issue
+
+RAG_RESPONSES = {
+    "pedestrian": _rag_response_pedestrian,
+    "speed": _rag_response_speed,
+    "shoulder": _rag_response_shoulder,
+    "general": _rag_response_general,
+}
+
+
 # --- RAG ANALYSIS FUNCTION (DUMMY IMPLEMENTATION) ---
 def get_rag_answer(query: str) -> Dict[str, Any]:
     """
-    Simulates a RAG database lookup and adds a task to the action plan.
+    Simulates a RAG database lookup; the derived action-plan task rides along
+    in the result so the caller can insert it even on a memoized hit.
     """
     
     # <--- 3. NEW: Access current weather context --->
@@ -295,100 +555,79 @@ def get_rag_answer(query: str) -> Dict[str, Any]:
         }
         
     query_lower = query.lower()
-    
-    confidence = round(random.uniform(0.85, 0.99), 2)
-    
+
+    # Derive the "random" values deterministically from the query so repeat
+    # queries give identical answers - a prerequisite for memoizing this
+    # function at its call site.
+    query_seed = zlib.crc32(query_lower.encode())
+    confidence = round(0.85 + (query_seed & 0x3FFF) / 0x3FFF * 0.14, 2)
+
     # <--- 4. NEW: Weather-specific intervention logic --->
-    if "fog" in current_weather.lower() or "mist" in current_weather.lower() or "haze" in current_weather.lower():
+    if _FOG_RE.search(current_weather.lower()):
         risk = "Critical"
-        intervention = [
-            "**IMMEDIATE FOG INTERVENTION:** Install/verify high-power, retro-reflective **Cat's Eye** road studs for lane delineation (IRC:67 compliant).",
-            "Deploy highly visible **Variable Message Signs (VMS)** warning of low visibility, as per MoRTH guidelines.",
-            "Enforce a temporary speed limit reduction (e.g., 40%) when visibility drops below 50 meters, citing IRC:SP-50."
-        ]
-        evidence = (
-            f"**CONTEXT-AWARE RECOMMENDATION (Weather: {current_weather}):** IRC:67 mandates retro-reflective elements for night-time/low-visibility driving. Fog-related accidents are often high-severity pile-ups, hence the critical risk assessment. **Confidence: {confidence}**"
-        )
+        intervention = _INTERV_FOG
+        evidence = _EVID_FOG_TPL.format(w=current_weather, c=confidence)
         issue = f"High-Risk: Fog/Mist Visibility Issues (Weather: {current_weather})"
     # <--- END NEW: Weather-specific block --->
-    
-    # Existing logic follows, checking query content only if no critical weather is found.
-    elif "zebra" in query_lower or "pedestrian" in query_lower or "crossing" in query_lower:
-        risk = "High"
-        intervention = [
-            "Implement a clear **Zebra Crossing** (IRC:35/IRC:67) with high-visibility thermoplastic paint.",
-            "Ensure a minimum of **2.5m clear visibility** distance for approaching vehicles.",
-            "Add 'Pedestrian Ahead' warning signs with flashing beacons."
-        ]
-        evidence = (
-            "IRC:67 mandates specific colors and widths for crossings. IRC:35 details pedestrian facilities and safe practices. "
-            f"MoRTH data suggests high fatality rates at un-marked crossings. **Confidence: {confidence}**"
-        )
-        issue = "Un-marked/Faded Pedestrian Crossing (IRC:35/IRC:67 violation)"
-        
-    elif "speed" in query_lower or "limit" in query_lower or "enforce" in query_lower:
-        risk = "Medium-to-High"
-        intervention = [
-            "Install **Rumble Strips** and clear speed limit signage (IRC:SP-50) on approach to high-risk zones.",
-            "Deploy Automated Speed Enforcement (ASE) cameras for continuous monitoring.",
-            "Conduct a **3-day speed study** to reassess the zone's design speed."
-        ]
-        evidence = (
-            "IRC:SP-50 provides guidelines for speed breakers and zones. MoRTH circulars recommend ASE for accident blackspots. "
-            f"Speeding remains the leading cause of fatal accidents in India. **Confidence: {confidence}**"
-        )
-        issue = "Inadequate speed control measures (IRC:SP-50 non-compliance)"
-
-    elif "shoulder" in query_lower or "width" in query_lower or "geometry" in query_lower:
-        risk = "Medium"
-        intervention = [
-            "Verify and reconstruct shoulder width to meet **IRC:69 standards** (typically 1.5m to 2.5m paved shoulder on NH/SH).",
-            "Maintain clear recovery zones beyond the shoulder to minimize roll-over risk.",
-            "Add edge line markings (thermoplastic paint) with minimum 150mm width."
-        ]
-        evidence = (
-            "IRC:69 specifies geometric design standards, including shoulder dimensions and side slopes. "
-            "Adequate shoulders reduce run-off-road accidents by providing recovery space. "
-            f"Poor geometry contributes to lane departure accidents. **Confidence: {confidence}**"
-        )
-        issue = "Shoulder width deficiency or lack of clear recovery zone (IRC:69 violation)"
-    
-    else: 
-        risk = "Low-to-Medium"
-        random_element = random.choice(["night-time glare mitigation", "wildlife crossings design", "bus bay design compliance", "toll plaza safety procedures"])
-        intervention = [
-            f"Analyze the specific IRC code for **{random_element}** (IRC:SP-52/IRC:81/IRC:103).",
-            "Review the last quarterly safety audit report for this general area.",
-            "Conduct a full semantic search on the query to pinpoint the exact IRC clause."
-        ]
-        evidence = (
-            f"The evidence base contains specific sections on **{random_element}** mitigation. A full semantic search across all indexed MoRTH/IRC documents is required to provide maximum precision. "
-            f"General safety compliance score check initiated. **Confidence: {confidence}**"
-        )
-        issue = f"General query about {random_element} standards."
 
-    if "error" not in locals():
-        new_task = {
-            "ID": f"RAG-{hashlib.md5(query.encode()).hexdigest()[:4].upper()}",
-            "Source": "RAG",
-            "Issue": issue,
-            "Intervention": ", ".join(interv.replace('**', '').replace('.', '') for interv in intervention[:2]), 
-            "Risk": risk.replace("-to-", "/"), 
-            "Status": "To Do"
-        }
-        if not any(t['Issue'] == new_task['Issue'] for t in st.session_state['action_plan']):
-            st.session_state['action_plan'].append(new_task)
+    # Existing logic follows, checking query content only if no critical weather is found.
+    else:
+        matched = "general"
+        for keywords, response_key in RAG_RULES:
+            if any(kw in query_lower for kw in keywords):
+                matched = response_key
+                break
+        risk, intervention, evidence, issue = RAG_RESPONSES[matched](confidence, query_seed)
+
+    # The plan insert is a side effect, so the task is handed back to the
+    # caller rather than inserted here: the memoized wrapper skips this
+    # function entirely on a cache hit, and the insert must still happen then.
+    new_task = {
+        "ID": f"RAG-{hashlib.md5(query.encode()).hexdigest()[:4].upper()}",
+        "Source": "RAG",
+        "Issue": issue,
+        "Intervention": ", ".join(interv.translate(_STRIP_BOLD_AND_DOTS) for interv in intervention[:2]),
+        "Risk": risk.replace("-to-", "/"),
+        "Status": "To Do"
+    }
 
     return {
         "intervention": intervention,
         "evidence": evidence,
-        "severity": f"**{risk.replace('-to-', '/')}**"
+        "severity": f"**{risk.replace('-to-', '/')}**",
+        "plan_task": new_task
     }
 
 
+def _read_jpeg_dims(data: bytes):
+    """
+    Reads width/height straight from a JPEG's SOF marker without touching PIL,
+    so no decoder is set up. Returns (width, height), or None if the data is
+    not a parseable JPEG (PNG/WebP fall back to PIL).
+    """
+    if not data.startswith(b'\xff\xd8'):
+        return None
+    i = 2
+    n = len(data)
+    while i + 9 < n:
+        if data[i] != 0xFF:
+            i += 1
+            continue
+        marker = data[i + 1]
+        # SOF0-SOF15 segments carry the frame dimensions (0xC4/0xC8/0xCC are not SOF)
+        if 0xC0 <= marker <= 0xCF and marker not in (0xC4, 0xC8, 0xCC):
+            height, width = struct.unpack('>HH', data[i + 5:i + 9])
+            return width, height
+        segment_length = struct.unpack('>H', data[i + 2:i + 4])[0]
+        i += 2 + segment_length
+    return None
+
+
 # --- AI ANALYSIS FUNCTION (DUMMY IMPLEMENTATION) ---
 def analyze_road_image(uploaded_file) -> Dict[str, Any]:
     # ... (function body remains unchanged) ...
+    import io
+    from PIL import Image
 
     if uploaded_file is None:
         return {
@@ -398,35 +637,52 @@ def analyze_road_image(uploaded_file) -> Dict[str, Any]:
 
     try:
         image_data = uploaded_file.read()
-        unique_file_id = hashlib.sha256(image_data).hexdigest()[:8]
-        image = Image.open(io.BytesIO(image_data))
-        width, height = image.size
-        aspect_ratio = width / height if height > 0 else 0 
+        # The ID is only a de-duplication key, not a security boundary, so a fast
+        # non-cryptographic hash is preferred for multi-MB uploads.
+        if xxhash is not None:
+            unique_file_id = xxhash.xxh3_64(image_data).hexdigest()[:8]
+        else:
+            unique_file_id = hashlib.sha256(image_data).hexdigest()[:8]
         file_size_kb = len(image_data) / 1024
         uploaded_file.seek(0)
+
+        filename = uploaded_file.name
+        width = height = None
+
+        # Cheap byte-level signals are tested first: the dimension parse (and
+        # any PIL fallback decode) only runs when neither the file size nor
+        # the filename settles the classification on its own.
+        if file_size_kb > 500 or "accident" in filename.lower():
+            analysis_key = "accident"
+        else:
+            dims = _read_jpeg_dims(image_data)
+            if dims is None:
+                # PIL's open is lazy: only the header is parsed as long as we
+                # never touch the pixel data, and closing releases the decoder.
+                with contextlib.closing(Image.open(io.BytesIO(image_data))) as image:
+                    dims = image.size
+            width, height = dims
+            aspect_ratio = width / height if height > 0 else 0
+
+            if aspect_ratio < 0.7:
+                analysis_key = "accident"
+            elif aspect_ratio > 1.8 and file_size_kb > 100:
+                analysis_key = "urban"
+            elif file_size_kb < 100:
+                analysis_key = "signage"
+            else:
+                analysis_key = "general"
     except Exception as e:
         return {
-            "error": True, 
+            "error": True,
             "message": f"Error reading image properties: {e}. Check file format."
         }
-    
-    filename = uploaded_file.name
-    analysis_key = ""
-
-    if file_size_kb > 500 or "accident" in filename.lower() or aspect_ratio < 0.7:
-        analysis_key = "accident"
-    elif aspect_ratio > 1.8 and file_size_kb > 100: 
-        analysis_key = "urban"
-    elif file_size_kb < 100: 
-        analysis_key = "signage"
-    else:
-        analysis_key = "general"
-    
+
     base_report = {
         "unique_id": unique_file_id,
         "size": f"{file_size_kb:.2f} KB",
-        "resolution": f"{width}x{height}",
-        "aspect_ratio": f"{aspect_ratio:.2f}",
+        "resolution": f"{width}x{height}" if width is not None else "n/a",
+        "aspect_ratio": f"{aspect_ratio:.2f}" if width is not None else "n/a",
     }
 
     if analysis_key == "accident":
@@ -483,26 +739,54 @@ def analyze_road_image(uploaded_file) -> Dict[str, Any]:
     ]
 
 
+    # Returned to the caller for insertion so memoized repeats still re-create
+    # the task (see get_rag_answer)
     new_task = {
         "ID": f"VIS-{unique_file_id[:4].upper()}",
         "Source": "Vision AI",
-        "Issue": identified_issues[1].replace('**', ''), 
-        "Intervention": suggested_interventions[0].replace('.', ''),
+        "Issue": identified_issues[1].translate(_STRIP_BOLD),
+        "Intervention": suggested_interventions[0].translate(_STRIP_DOTS),
         "Risk": risk_level,
         "Status": "To Do"
     }
-    if not any(t['Issue'] == new_task['Issue'] for t in st.session_state['action_plan']):
-        st.session_state['action_plan'].append(new_task)
 
     identified_issues.insert(0, f"**FILE TRACE ID:** `{base_report['unique_id']}` | **Size:** {base_report['size']} | **Resolution:** {base_report['resolution']}")
-    
+
     return {
         "identified_issues": identified_issues,
         "risk_summary": risk_summary,
-        "suggested_interventions": suggested_interventions
+        "suggested_interventions": suggested_interventions,
+        "plan_task": new_task
     }
 
 
+# Call-site memoization: the weather context is part of both keys so cached
+# answers invalidate when the context changes, and repeat inputs skip the
+# analysis entirely.
+@st.cache_data(ttl=3600, show_spinner=False)
+def _cached_rag(question: str, weather: str) -> Dict[str, Any]:
+    return get_rag_answer(question)
+
+@st.cache_data(ttl=3600, show_spinner=False)
+def _cached_vision(file_bytes: bytes, name: str, weather: str) -> Dict[str, Any]:
+    import io
+
+    class _NamedBytesIO(io.BytesIO):
+        """BytesIO subclass so the classifier can read the original filename."""
+
+    buf = _NamedBytesIO(file_bytes)
+    buf.name = name
+    return analyze_road_image(buf)
+
+def _li_html(items: List[str]) -> str:
+    """Escapes and joins list items into <li> markup, once per result change.
+
+    The rendered string is cached on the result dict so reruns interpolate a
+    ready-made string instead of re-escaping every item on each widget event.
+    """
+    return ''.join(f'<li>{html.escape(item)}</li>' for item in items)
+
+
 # --- GEOGRAPHICAL RISK DATA ---
 RISK_ZONES = [
 # ... (existing RISK_ZONES data remains unchanged) ...
@@ -535,51 +819,107 @@ RISK_ZONES = [
      "popup_text": "Predicted Cause: **Unauthorized Parking**, Sight Distance Obstruction. Intervention: **Tow-Away Zones, Clear Visibility**."},
 ]
 
+# Popup HTML is static per zone, so it is formatted exactly once here instead
+# of on every filter change inside the map build.
+for zone in RISK_ZONES:
+    zone['popup_html'] = (
+        f"<b>{zone['name']}</b><br>Risk: <span style='color:{zone['color']}; font-weight:bold;'>{zone['risk']}</span>"
+        f"<br>Road Type: {zone['road_type']}<br>Weather: {', '.join(zone['weather'])}<br>{zone['popup_text']}"
+    )
+
+# Precomputed once at module load: categorical columns keep the filter comparisons
+# as fast C-level array ops, and the frozensets make the weather membership test O(1).
+RISK_DF = pd.DataFrame(RISK_ZONES).astype({'risk': 'category', 'road_type': 'category'})
+WEATHER_SETS = RISK_DF['weather'].apply(frozenset)
+
 @st.cache_data
-def create_folium_map(risk_filter: str, road_type_filter: str, weather_filter: str):
-# ... (function body remains unchanged) ...
-    """
-    Creates a Folium map, filtering markers based on the selected risk level,
-    road type, and weather condition.
-    """
-    # Centered near New Delhi
-    m = folium.Map(location=[28.7041, 77.1025], zoom_start=6) 
-    
-    folium.TileLayer('cartodbpositron', name='Light Basemap').add_to(m)
-    folium.TileLayer('OpenStreetMap', name='Detailed Streets').add_to(m)
-    
-    marker_group = folium.FeatureGroup(name="Safety Risk Zones").add_to(m)
+def filter_risk_zones(risk_filter: str, road_type_filter: str, weather_filter: str) -> pd.DataFrame:
+    """Applies the three sidebar filters to RISK_DF with one vectorized boolean mask."""
+    mask = np.ones(len(RISK_DF), dtype=bool)
 
-    filtered_zones = RISK_ZONES
-    
     # 1. Filter by Risk Level
     if risk_filter != "All Risk Levels":
-        filtered_zones = [zone for zone in filtered_zones if zone['risk'] == risk_filter]
+        mask &= (RISK_DF['risk'] == risk_filter).values
 
     # 2. Filter by Road Type
     if road_type_filter != "All Road Types":
-        filtered_zones = [zone for zone in filtered_zones if zone['road_type'] == road_type_filter]
+        mask &= (RISK_DF['road_type'] == road_type_filter).values
 
     # 3. Filter by Weather
     if weather_filter != "All Conditions":
-        filtered_zones = [zone for zone in filtered_zones if weather_filter in zone['weather']]
+        mask &= WEATHER_SETS.apply(lambda s: weather_filter in s).values
+
+    return RISK_DF[mask]
+
+@st.cache_resource(max_entries=32, show_spinner=False)
+def create_folium_map(risk_filter: str, road_type_filter: str, weather_filter: str):
+    """
+    Creates a Folium map, filtering markers based on the selected risk level,
+    road type, and weather condition. Cached by reference (cache_resource)
+    because folium.Map is a mutable, layer-bearing object that cache_data
+    would have to pickle on every store/retrieve.
+    """
+    import folium
+
+    # Centered near New Delhi
+    m = folium.Map(location=[28.7041, 77.1025], zoom_start=6)
+
+    folium.TileLayer('cartodbpositron', name='Light Basemap').add_to(m)
+    folium.TileLayer('OpenStreetMap', name='Detailed Streets').add_to(m)
+
+    filtered_zones = filter_risk_zones(risk_filter, road_type_filter, weather_filter)
+
+    # A single GeoJson layer ships every zone to Leaflet in one JSON blob, so
+    # the per-zone template expansion happens client-side instead of building
+    # a Jinja-bearing Marker object per zone on the server.
+    feature_collection = {
+        "type": "FeatureCollection",
+        "features": [
+            {
+                "type": "Feature",
+                "geometry": {"type": "Point", "coordinates": [zone.lon, zone.lat]},
+                "properties": {
+                    "name": zone.name,
+                    "risk": zone.risk,
+                    "road_type": zone.road_type,
+                    "color": zone.color,
+                    "popup_html": zone.popup_html,
+                },
+            }
+            for zone in filtered_zones.itertuples(index=False)
+        ],
+    }
+
+    # GeoJsonTooltip asserts its fields against the first feature at render
+    # time, so an empty collection (a filter combination matching no zones)
+    # must skip the layer entirely and just draw the bare map.
+    if feature_collection["features"]:
+        folium.GeoJson(
+            feature_collection,
+            name="Safety Risk Zones",
+            marker=folium.CircleMarker(radius=8, weight=2, fill=True, fill_opacity=0.9),
+            style_function=lambda feature: {
+                "color": feature["properties"]["color"],
+                "fillColor": feature["properties"]["color"],
+            },
+            tooltip=folium.GeoJsonTooltip(fields=["name", "risk", "road_type"]),
+            popup=folium.GeoJsonPopup(fields=["popup_html"], labels=False),
+        ).add_to(m)
 
-    for zone in filtered_zones:
-        icon_color = zone["color"]
-        icon_name = "flag" if zone['risk'] == "Critical" else ("exclamation-triangle" if zone['risk'] == "High" else "info-circle")
-        
-        popup_html = f"<b>{zone['name']}</b><br>Risk: <span style='color:{icon_color}; font-weight:bold;'>{zone['risk']}</span><br>Road Type: {zone['road_type']}<br>Weather: {', '.join(zone['weather'])}<br>{zone.get('popup_text', 'Monitor traffic flow.')}"
-        
-        folium.Marker(
-            location=[zone["lat"], zone["lon"]], 
-            popup=folium.Popup(popup_html, max_width=300), 
-            icon=folium.Icon(color=icon_color, icon=icon_name, prefix='fa')
-        ).add_to(marker_group)
-        
     folium.LayerControl().add_to(m)
-    
+
     return m
 
+@st.cache_resource(max_entries=32, show_spinner=False)
+def render_folium_map(risk_filter: str, road_type_filter: str, weather_filter: str) -> str:
+    """
+    Builds the map and pre-renders it to an HTML string, cached per filter
+    combination. Reruns triggered by unrelated widgets reuse the rendered
+    string instead of paying the Jinja/Leaflet template expansion again.
+    """
+    m = create_folium_map(risk_filter, road_type_filter, weather_filter)
+    return m.get_root().render()
+
 # --- SIDEBAR FOR FILTERING & GUIDE (UPDATED) ---
 
 # --- SHECODES TEAM BRANDING (NEW IMAGE LOGO) ---
@@ -619,6 +959,21 @@ selected_weather = st.sidebar.selectbox(
     key="map_weather_filter"
 )
 
+# Kick off the map render as soon as the filters are known so the (cache-miss)
+# Folium build overlaps with everything drawn above the map section; the
+# future is resolved where the map is embedded.
+def _render_map_job(ctx, risk_filter: str, road_type_filter: str, weather_filter: str) -> str:
+    """Renders the map on a worker thread with the script's context attached,
+    so the cached functions can talk to Streamlit without 'missing
+    ScriptRunContext' warnings."""
+    add_script_run_ctx(threading.current_thread(), ctx)
+    return render_folium_map(risk_filter, road_type_filter, weather_filter)
+
+_map_future = _executor().submit(
+    _render_map_job, get_script_run_ctx(),
+    selected_risk_level, selected_road_type, selected_weather
+)
+
 st.sidebar.markdown("---")
 st.sidebar.header("App Guide")
 st.sidebar.info(
@@ -630,153 +985,167 @@ st.sidebar.info(
 
 # --- 1. TOP BANNER AND METRICS ---
 
-# Styled Banner Title (Using the dark gradient CSS class)
-st.markdown("""
-<div class="dashboard-header">
-    <h1 style="color: white; margin: 0; font-size: 2.5rem;">
-        <i class="fas fa-traffic-light"></i> RoadSafetyGPT
-    </h1>
-    <p style="margin: 5px 0 0 0; font-size: 1.1rem; font-weight: 300; text-align: center;">
-        AI Assistant for Indian Road Safety & Compliance (IRC/MoRTH)
-    </p>
-</div>
-""", unsafe_allow_html=True)
-
-
-col1, col2, col3 = st.columns(3)
-
-# DUMMY DATA 
+# DUMMY DATA
 kpi_data = {
-    "Potential Risk Reduction": {"value": "24%", "delta": 2, "delta_color": "normal"}, 
-    "Accidents Predicted This Month": {"value": "12", "delta": -8, "delta_color": "inverse"}, 
-    "IRC Compliance Score": {"value": "91%", "delta": 3, "delta_color": "normal"}, 
+    "Potential Risk Reduction": {"value": "24%", "delta": 2, "delta_color": "normal", "unit": "%"},
+    "Accidents Predicted This Month": {"value": "12", "delta": -8, "delta_color": "inverse", "unit": " Cases"},
+    "IRC Compliance Score": {"value": "91%", "delta": 3, "delta_color": "normal", "unit": " Pts"},
 }
 
-# Displaying KPIs
-with col1:
-    st.metric(label="Potential Risk Reduction", 
-              value=kpi_data["Potential Risk Reduction"]["value"], 
-              delta=f"+{kpi_data['Potential Risk Reduction']['delta']}% ⬆️")
-    
-with col2:
-    st.metric(label="Accidents Predicted This Month", 
-              value=kpi_data["Accidents Predicted This Month"]["value"], 
-              delta=f"{abs(kpi_data['Accidents Predicted This Month']['delta'])} Cases ⬇️", 
-              delta_color='inverse') 
-
-with col3:
-    st.metric(label="IRC Compliance Score", 
-              value=kpi_data["IRC Compliance Score"]["value"], 
-              delta=f"+{kpi_data['IRC Compliance Score']['delta']} Pts ⬆️")
+_KPI_CARD_TPL = (
+    '<div class="kpi"><span class="kpi-label">{label}</span>'
+    '<span class="kpi-value">{value}</span>'
+    '<span class="kpi-delta {direction}">{delta}</span></div>'
+)
 
-st.markdown("<br>", unsafe_allow_html=True) 
+def _kpi_card(label: str, kpi: Dict[str, Any]) -> str:
+    """Formats one KPI card, honoring st.metric's delta_color semantics:
+    'inverse' means a falling number is the good (green) direction."""
+    delta = kpi["delta"]
+    good = delta < 0 if kpi["delta_color"] == "inverse" else delta > 0
+    if delta > 0:
+        delta_text = f"+{delta}{kpi['unit']} ⬆️"
+    else:
+        delta_text = f"{abs(delta)}{kpi['unit']} ⬇️"
+    return _KPI_CARD_TPL.format(label=label, value=kpi["value"],
+                                direction="up" if good else "down", delta=delta_text)
+
+# Banner, KPI cards and the next section title are emitted as ONE markdown call
+# so every rerun ships a single message to the frontend instead of seven.
+_header_html = (
+    '<div class="dashboard-header">'
+    '<h1 style="color: white; margin: 0; font-size: 2.5rem;">'
+    '<i class="fas fa-traffic-light"></i> RoadSafetyGPT</h1>'
+    '<p style="margin: 5px 0 0 0; font-size: 1.1rem; font-weight: 300; text-align: center;">'
+    'AI Assistant for Indian Road Safety & Compliance (IRC/MoRTH)</p>'
+    '</div>'
+    '<div class="kpi-row">'
+    + ''.join(_kpi_card(label, kpi) for label, kpi in kpi_data.items())
+    + '</div>'
+)
 
 # <--- 5. NEW SECTION: REAL-TIME CONTEXTUAL INPUT (To make RAG Adaptive) --->
-st.markdown("## 🌦 Real-Time Contextual Input (Enhances RAG Precision)", unsafe_allow_html=True)
+st.markdown(
+    _header_html + "\n\n## 🌦 Real-Time Contextual Input (Enhances RAG Precision)",
+    unsafe_allow_html=True
+)
 
-col_loc, col_btn = st.columns([4, 1])
+# Status messages are classified by their first character: success messages
+# start with "Weather context updated", errors/warnings with ❌ or ⚠, and
+# everything else renders as info. One dict lookup replaces the old
+# startswith chain run on every rerun.
+_STATUS_RENDERERS = {'W': st.success, '❌': st.error, '⚠': st.error}
+
+# The fragment keeps a weather click from re-running the whole script: only
+# this region re-executes, so the Folium map and the action-plan editor are
+# untouched by a fetch. (Other sections pick up the new context on their next
+# natural rerun.)
+@st.fragment
+def _weather_fragment():
+    col_loc, col_btn = st.columns([4, 1])
+
+    with col_loc:
+        location_input = st.text_input(
+            "Enter City/Location to Fetch Real-Time Weather:",
+            "New Delhi, India",
+            key="weather_location_input",
+            label_visibility="collapsed"
+        )
 
-with col_loc:
-    location_input = st.text_input(
-        "Enter City/Location to Fetch Real-Time Weather:", 
-        "New Delhi, India",
-        key="weather_location_input",
-        label_visibility="collapsed"
-    )
+    with col_btn:
+        weather_fetch_btn = st.button("🌦 Fetch Weather", key="fetch_weather_btn")
 
-with col_btn:
-    weather_fetch_btn = st.button("🌦 Fetch Weather", key="fetch_weather_btn")
+    # ---------------------------------------------------------------------
+    # START: WEATHER FETCH LOGIC
+    if weather_fetch_btn:
+        # Set a temporary loading status
+        st.session_state['last_fetch_status'] = 'Fetching live weather data...'
 
-# -------------------------------------------------------------------------
-# START: WEATHER FETCH LOGIC
-if weather_fetch_btn:
-    # Set a temporary loading status
-    st.session_state['last_fetch_status'] = 'Fetching live weather data...' 
-    
-    # **FIX APPLIED HERE:** Check for the new explicit placeholder key
-    if WEATHER_API_KEY == "YOUR_ACTUAL_OPENWEATHERMAP_API_KEY_HERE":
-        st.session_state['last_fetch_status'] = "⚠️ **API Key Placeholder**: Please replace the placeholder key in `app.py` with your actual key to enable real-time fetching."
-        st.session_state['current_weather'] = "Clear (API Key Placeholder)"
-    else:
-        try:
-            with st.spinner('Fetching live weather data...'):
-                params = {
-                    'q': location_input,
-                    'appid': WEATHER_API_KEY,
-                    'units': 'metric'
-                }
-                response = requests.get(WEATHER_API_URL, params=params, timeout=10)
-
-                # Check for 401 (API Key Inactive/Invalid) and 404 (City Not Found) first
-                if response.status_code == 401:
-                    try:
-                        api_message = response.json().get('message', 'Invalid API key or key not yet active.')
-                    except:
-                        api_message = 'Invalid API key or key not yet active. Response was not JSON.'
-                    
+        _cooldown_until = st.session_state.get('_weather_cooldown_until', 0)
+
+        # Honor an active 429 cooldown before touching the network again
+        if time.time() < _cooldown_until:
+            st.session_state['last_fetch_status'] = (
+                f"⚠️ **Rate Limited**: Weather API cooldown in effect. "
+                f"Please try again in {int(_cooldown_until - time.time()) + 1}s."
+            )
+        # **FIX APPLIED HERE:** Check for the new explicit placeholder key
+        elif WEATHER_API_KEY == "YOUR_ACTUAL_OPENWEATHERMAP_API_KEY_HERE":
+            st.session_state['last_fetch_status'] = "⚠️ **API Key Placeholder**: Please replace the placeholder key in `app.py` with your actual key to enable real-time fetching."
+            st.session_state['current_weather'] = "Clear (API Key Placeholder)"
+        else:
+            try:
+                with st.spinner('Fetching live weather data...'):
+                    # Cached per location for 10 minutes; repeat lookups skip the network.
+                    weather_data = fetch_weather(location_input)
+
+                    # Extract relevant weather condition
+                    main_weather = weather_data['weather'][0]['main'] # e.g., 'Clouds', 'Rain', 'Mist'
+                    description = weather_data['weather'][0]['description']
+                    temp = round(weather_data['main']['temp']) # FIX: Rounding temperature
+
+                    # Store the weather condition and description for use in the RAG prompt/logic
+                    weather_string = f"{main_weather} ({description})"
+                    st.session_state['current_weather'] = weather_string
+
+                    # Store success message in session state
+                    st.session_state['last_fetch_status'] = f"Weather context updated for **{location_input}**: **{weather_string}** | Temperature: {temp}°C"
+                    st.session_state['_weather_429_attempts'] = 0  # reset backoff on success
+
+            except WeatherAPIError as e:
+                # 401 (API Key Inactive/Invalid) and 404 (City Not Found) get dedicated messages
+                if e.status_code == 401:
+                    api_message = e.message or 'Invalid API key or key not yet active.'
                     st.session_state['last_fetch_status'] = f"❌ **API Key Error (401)**: {api_message}. Please ensure your key is correct and fully activated (may take up to 2 hours)."
                     st.session_state['current_weather'] = "Clear (API Key Error)"
-                    st.rerun() # FIX: Replaced st.experimental_rerun()
-                    
-                
-                if response.status_code == 404:
-                    try:
-                        api_message = response.json().get('message', 'City not found.')
-                    except:
-                        api_message = 'City not found. Response was not JSON.'
-                        
+
+                elif e.status_code == 404:
+                    api_message = e.message or 'City not found.'
                     st.session_state['last_fetch_status'] = f"❌ **Location Error (404)**: {api_message}. Please check the spelling of the location."
                     st.session_state['current_weather'] = "Clear (Location Not Found)"
-                    st.rerun() # FIX: Replaced st.experimental_rerun()
-                    # FIX: Removed the invalid 'return' statement
-                    
-                
-                # Raise an exception for all other HTTP errors (e.g., 500 server error)
-                response.raise_for_status() 
-                
-                # Only proceed to parse JSON if the status is 200 OK
-                weather_data = response.json()
 
-                # Extract relevant weather condition
-                main_weather = weather_data['weather'][0]['main'] # e.g., 'Clouds', 'Rain', 'Mist'
-                description = weather_data['weather'][0]['description']
-                temp = round(weather_data['main']['temp']) # FIX: Rounding temperature
-                
-                # Store the weather condition and description for use in the RAG prompt/logic
-                weather_string = f"{main_weather} ({description})"
-                st.session_state['current_weather'] = weather_string
-                
-                # Store success message in session state
-                st.session_state['last_fetch_status'] = f"Weather context updated for **{location_input}**: **{weather_string}** | Temperature: {temp}°C"
-                st.rerun() # FIX: Replaced st.experimental_rerun()
-        
-        except requests.exceptions.RequestException as e:
-            # Store error message
-            st.session_state['last_fetch_status'] = f"Could not connect to the API. Check your network or base URL. Error: {e}"
-            st.session_state['current_weather'] = "Clear (Connection Error)"
-        except Exception as e:
-            # Store error message
-            st.session_state['last_fetch_status'] = f"An unexpected programming error occurred: {e}"
-            st.session_state['current_weather'] = "Clear (Unknown Error)"
-# END: WEATHER FETCH LOGIC
-# -------------------------------------------------------------------------
-
-# --- Display Persistent Status Message (FIX 2b) ---
-if st.session_state['last_fetch_status'] != 'Initial Load':
-    # Check if the message is a success message
-    if st.session_state['last_fetch_status'].startswith('Weather context updated'):
-        st.success(st.session_state['last_fetch_status'])
-    # Check if the message is an error or warning (starting with ❌ or ⚠️)
-    elif st.session_state['last_fetch_status'].startswith(('❌', '⚠️')):
-        st.error(st.session_state['last_fetch_status'])
-    # If it's a non-critical error or simple message, show it as info
-    elif st.session_state['last_fetch_status'] != 'Fetching live weather data...':
-        st.info(st.session_state['last_fetch_status'])
-
-
-st.caption(f"Current Weather Context: **{st.session_state['current_weather']}** (This context is used by the RAG bot.)")
-
-st.markdown("---") 
+                elif e.status_code == 429:
+                    # Respect Retry-After when sent; otherwise back off
+                    # exponentially with jitter so repeated clicks don't hammer
+                    # an already rate-limited key.
+                    attempt = st.session_state.get('_weather_429_attempts', 0) + 1
+                    st.session_state['_weather_429_attempts'] = attempt
+                    try:
+                        retry_after = int(e.retry_after or 0)
+                    except ValueError:
+                        retry_after = 0
+                    if retry_after <= 0:
+                        retry_after = min(60, 2 ** attempt) + random.uniform(0, 1)
+                    st.session_state['_weather_cooldown_until'] = time.time() + retry_after
+                    st.session_state['last_fetch_status'] = f"⚠️ **Rate Limited (429)**: Too many requests. Next fetch allowed in {int(retry_after) + 1}s."
+                    st.session_state['current_weather'] = "Clear (Rate Limited)"
+
+                else:
+                    st.session_state['last_fetch_status'] = f"Could not connect to the API. Check your network or base URL. Error: {e}"
+                    st.session_state['current_weather'] = "Clear (Connection Error)"
+
+            except requests.exceptions.RequestException as e:
+                # Store error message
+                st.session_state['last_fetch_status'] = f"Could not connect to the API. Check your network or base URL. Error: {e}"
+                st.session_state['current_weather'] = "Clear (Connection Error)"
+            except Exception as e:
+                # Store error message
+                st.session_state['last_fetch_status'] = f"An unexpected programming error occurred: {e}"
+                st.session_state['current_weather'] = "Clear (Unknown Error)"
+    # END: WEATHER FETCH LOGIC
+    # -------------------------------------------------------------------------
+
+    # --- Display Persistent Status Message (FIX 2b) ---
+    status_msg = st.session_state['last_fetch_status']
+    if status_msg not in ('Initial Load', 'Fetching live weather data...'):
+        _STATUS_RENDERERS.get(status_msg[:1], st.info)(status_msg)
+
+
+    st.caption(f"Current Weather Context: **{st.session_state['current_weather']}** (This context is used by the RAG bot.)")
+
+_weather_fragment()
+
+st.markdown("---")
 # <--- END NEW WEATHER INPUT --->
 
 
@@ -820,7 +1189,12 @@ with st.container():
             if rag_button:
                 if question:
                     with st.spinner('Querying IRC/MoRTH knowledge base...'):
-                        rag_output = get_rag_answer(question)
+                        rag_output = _cached_rag(question, st.session_state['current_weather'])
+                        if "error" not in rag_output:
+                            # Insert after the cached lookup so a memoized
+                            # repeat still re-creates a since-cleared task
+                            _append_plan_task(rag_output['plan_task'])
+                            rag_output['_interv_html'] = _li_html(rag_output['intervention'])
                         st.session_state['rag_result'] = rag_output
                 else:
                     st.warning("Please enter a question.")
@@ -836,7 +1210,7 @@ with st.container():
                         <div class="rag-output-container">
                             <p class="rag-subheader"><i class="fas fa-tools"></i> Suggested Intervention (IRC/MoRTH Compliant)</p>
                             <ul>
-                                {(''.join(f'<li>{interv}</li>' for interv in result['intervention']))}
+                                {result['_interv_html']}
                             </ul>
                             <p class="rag-subheader"><i class="fas fa-book"></i> Evidence Base & Confidence</p>
                             <p>{result['evidence']}</p>
@@ -898,7 +1272,14 @@ with st.container():
                 if uploaded_file is not None:
                     st.session_state['analysis_result'] = None 
                     with st.spinner(f'Analyzing {uploaded_file.name} against IRC/MoRTH standards...'):
-                        analysis_output = analyze_road_image(uploaded_file)
+                        analysis_output = _cached_vision(
+                            uploaded_file.getvalue(), uploaded_file.name,
+                            st.session_state['current_weather']
+                        )
+                        if "error" not in analysis_output:
+                            _append_plan_task(analysis_output['plan_task'])
+                            analysis_output['_issues_html'] = _li_html(analysis_output['identified_issues'])
+                            analysis_output['_interv_html'] = _li_html(analysis_output['suggested_interventions'])
                         st.session_state['analysis_result'] = analysis_output
                 else:
                     st.warning("Please upload an image before running the analysis.")
@@ -914,11 +1295,11 @@ with st.container():
                         <div class="rag-output-container">
                             <p class="rag-subheader"><i class="fas fa-bug"></i> Identified Issues & Traceability</p>
                             <ul>
-                                {(''.join(f'<li>{issue}</li>' for issue in result['identified_issues']))}
+                                {result['_issues_html']}
                             </ul>
                             <p class="rag-subheader"><i class="fas fa-screwdriver"></i> Suggested Interventions (Actionable Steps)</p>
                             <ul>
-                                {(''.join(f'<li>{interv}</li>' for interv in result['suggested_interventions']))}
+                                {result['_interv_html']}
                             </ul>
                             <p class="rag-severity"><i class="fas fa-exclamation-triangle"></i> Risk Summary: {result['risk_summary']}</p>
                         </div>
@@ -942,10 +1323,18 @@ st.markdown("<br>", unsafe_allow_html=True)
 with st.container():
     st.markdown("## 🌍 Geographical Risk Analysis (AI Prediction)")
     
-    # Removed the column structure to allow the map to take full width
-    m = create_folium_map(selected_risk_level, selected_road_type, selected_weather)
-    # FIX APPLIED HERE: use_container_width=True ensures the map spans the full width of the container.
-    st_folium(m, height=500, use_container_width=True) 
+    # Removed the column structure to allow the map to take full width.
+    # A failed background render degrades to an inline error for this section
+    # instead of taking down the whole script.
+    try:
+        map_html = _map_future.result()
+    except Exception as e:
+        st.error(f"Could not render the risk map: {e}")
+    else:
+        # One-way embed of the pre-rendered HTML: unlike st_folium there is no
+        # click/zoom binding back to the server, so panning or clicking markers
+        # never triggers a script rerun, and reruns never re-render the map.
+        components.html(map_html, height=500)
 
     st.markdown("""
     <div class="risk-summary-container" style="margin-top: 5px;">
@@ -969,8 +1358,8 @@ with st.container():
     with clear_col:
         st.button("🧹 Clear Completed Tasks", on_click=clear_completed_tasks, key="clear_tasks_btn")
 
-    action_df = pd.DataFrame(st.session_state['action_plan'])
-    
+    action_df = st.session_state['action_plan']
+
     if not action_df.empty:
         key_suffix = len(action_df) 
         
@@ -1002,11 +1391,14 @@ with st.container():
             key=f"action_plan_editor_{key_suffix}"
         )
         
-        try:
-            if not action_df.equals(edited_df):
-                st.session_state['action_plan'] = edited_df.to_dict('records')
-        except Exception:
-            pass
+        # Streamlit already records just the diff under the editor's key, so an
+        # O(1) check on that metadata replaces a full-DataFrame equals() per rerun
+        changes = st.session_state.get(f"action_plan_editor_{key_suffix}", {})
+        if changes.get("edited_rows") or changes.get("added_rows") or changes.get("deleted_rows"):
+            # Reset the index so labels stay contiguous after deletions;
+            # appends rely on unique labels to avoid overwriting rows
+            st.session_state['action_plan'] = edited_df.reset_index(drop=True)
+            st.session_state['action_plan_issues'] = set(edited_df['Issue'])
             
 
     else:
@@ -1033,18 +1425,10 @@ with st.container():
         
     st.markdown("<br>", unsafe_allow_html=True)
     
-    # Simulated Comparative Chart
-    # Create a data structure for a STACKED BAR CHART
-    stacked_data = pd.DataFrame({
-        'Period': ['Q3 2023 (Baseline)', 'Q3 2024 (Current)'],
-        'Fatalities': [40, 38],
-        'Serious Injuries': [155, 170],
-        'Minor Injuries': [188, 244]
-    }).set_index('Period') # Set Period as index for bar chart categories.
-
+    # Simulated Comparative Chart (module-level _STACKED_DATA)
     # Using the same theme colors: Red (#C0392B), Purple (#6C3483), Yellow (#FFC300)
     st.bar_chart(
-        stacked_data,
+        _STACKED_DATA,
         color=["#C0392B", "#6C3483", "#FFC300"]
     )
     
@@ -1053,16 +1437,6 @@ with st.container():
 st.markdown("---")
 
 # --- 6. KNOWLEDGE BASE TRANSPARENCY (Refined for aesthetic) ---
-coverage_data = pd.DataFrame({
-    'Source': ['MoRTH Reports', 'IRC Codes', 'NCRB Data'], 
-    'Count': [450, 35, 15]
-})
-confidence_points = {
-    'Confidence (77-100%)': [0.70, 0.74, 0.76, 0.80, 0.84, 0.88, 0.90, 0.92, 0.96, 1.00], 
-    'Frequency': [100, 80, 100, 120, 150, 100, 180, 220, 400, 50]
-}
-confidence_match_df = pd.DataFrame(confidence_points)
-
 # Use the custom CSS class to style this section container
 st.markdown('<div class="data-integrity-container">', unsafe_allow_html=True)
 st.markdown("## ⚠ Data Integrity & Transparency")
@@ -1073,7 +1447,7 @@ with col_data_coverage:
     st.markdown("### Indexed Document Coverage")
     
     # Use the secondary yellow color for the bars to stand out on the dark background
-    st.bar_chart(coverage_data, x='Source', y='Count', color='#FFC300') 
+    st.bar_chart(_COVERAGE_DATA, x='Source', y='Count', color='#FFC300')
     
     # Wrap the percentages in a new div for the CSS change (Step 1)
     st.markdown("""
@@ -1088,7 +1462,7 @@ with col_model_confidence:
     st.markdown("### Model Confidence Distribution")
     
     # Use white color for the line to stand out clearly
-    st.line_chart(confidence_match_df, x='Confidence (77-100%)', y='Frequency', color='#FFFFFF')
+    st.line_chart(_CONFIDENCE_MATCH_DF, x='Confidence (77-100%)', y='Frequency', color='#FFFFFF')
 
 st.markdown('</div>', unsafe_allow_html=True)
 st.info("Transparency Note: The charts above represent the simulated coverage and confidence levels of the internal RAG knowledge base, ensuring users understand the breadth and reliability of the AI's recommendations.")
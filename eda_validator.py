@@ -6,30 +6,65 @@ or multimodal handling.
 
 Includes NLTK initialization to resolve environment-related 'undefined' errors.
 """
+import functools
+import re
 import pandas as pd
 import numpy as np
 import nltk
 import os
-from typing import Optional
+try:
+    import polars as pl  # Optional: multithreaded profiling of large files
+except ImportError:
+    pl = None
+from itertools import chain
+from multiprocessing import Pool
+from typing import Literal, Optional
 
 # --- NLTK Data Download ---
 # CRITICAL: This addresses the Pylance error 'nltk' is not defined by ensuring 
 # the necessary NLTK corpora are downloaded before any NLTK function is called.
+_NLTK_READY = False
+
 def setup_nltk():
     """Downloads required NLTK data if not already present."""
-    try:
-        nltk.data.find('tokenizers/punkt')
-    except nltk.downloader.DownloadError:
-        print("Downloading NLTK 'punkt' tokenizer...")
-        nltk.download('punkt', quiet=True)
-    
-    try:
-        nltk.data.find('corpora/stopwords')
-    except nltk.downloader.DownloadError:
-        print("Downloading NLTK 'stopwords'...")
-        nltk.download('stopwords', quiet=True)
+    global _NLTK_READY
+    if _NLTK_READY:
+        return
+    for resource, package in [('tokenizers/punkt', 'punkt'), ('corpora/stopwords', 'stopwords')]:
+        try:
+            # data.find raises LookupError on a missing resource (the old
+            # DownloadError clause never matched, so downloads never ran)
+            nltk.data.find(resource)
+        except LookupError:
+            print(f"Downloading NLTK '{package}'...")
+            nltk.download(package, quiet=True)
+    _NLTK_READY = True
     print("NLTK setup complete.")
 
+# Loaded once at import: rebuilding the stopword set and re-resolving the
+# tokenizer inside analyze_text_column charged every call (and every row) for
+# work that never changes.
+setup_nltk()
+_STOP_WORDS = frozenset(nltk.corpus.stopwords.words('english'))
+_TOKENIZER = nltk.tokenize.TreebankWordTokenizer()
+_WORD_RE = re.compile(r"[a-z0-9]+")
+
+# Incident descriptions are heavily templated, so caching per unique string
+# collapses N tokenizations down to N-unique when this runs over a column.
+# Below this many rows the fork/pickle overhead of a worker pool outweighs
+# any tokenization speedup, so the parallel path stays off for small frames.
+_MIN_ROWS_FOR_PARALLEL = 10_000
+
+def _count_tokens_chunk(texts):
+    """Counts Treebank tokens for a chunk of rows (module-level: picklable)."""
+    return [len(_TOKENIZER.tokenize(text)) for text in texts]
+
+@functools.lru_cache(maxsize=100_000)
+def _remove_stopwords(text: str) -> str:
+    # One C-level regex scan over the lowercased text yields alphanumeric
+    # tokens directly, replacing per-token .lower()/.isalnum() Python calls
+    return " ".join(w for w in _WORD_RE.findall(text.lower()) if w not in _STOP_WORDS)
+
 class EDAValidator:
     """
     A utility class for cleaning, validating, and performing basic EDA
@@ -39,67 +74,132 @@ class EDAValidator:
         self.df = df
         self.initial_shape = df.shape
         self.validation_report = {}
+        # Profile stats precomputed by from_parquet, when available
+        self._parquet_profile = {}
+
+    @classmethod
+    def from_parquet(cls, path: str) -> "EDAValidator":
+        """Builds a validator from a Parquet file.
+
+        With polars installed, the null-count and unique-count profile runs
+        as multithreaded lazy scans in Rust and is cached so
+        run_basic_checks skips its sequential pandas passes over the frame.
+        Falls back to a plain pandas read otherwise.
+        """
+        if pl is None:
+            return cls(pd.read_parquet(path))
+
+        lazy = pl.scan_parquet(path)
+        nulls, uniques, frame = pl.collect_all([
+            lazy.select(pl.all().null_count()),
+            lazy.select(pl.all().n_unique()),
+            lazy,
+        ])
+        validator = cls(frame.to_pandas())
+        validator._parquet_profile = {
+            "missing_values": dict(zip(nulls.columns, nulls.row(0))),
+            "unique_counts": dict(zip(uniques.columns, uniques.row(0))),
+        }
+        return validator
 
     def run_basic_checks(self) -> dict:
         """Checks for missing values, unique counts, and data types."""
         print("--- Running Basic Data Checks ---")
+        # Dict comprehensions over the underlying arrays skip the intermediate
+        # Series and the per-column Python lambda frames
         report = {
             "initial_shape": self.initial_shape,
-            "data_types": self.df.dtypes.apply(lambda x: x.name).to_dict(),
-            "missing_values": self.df.isnull().sum().to_dict(),
-            "unique_counts": self.df.nunique().to_dict()
+            "data_types": {col: dt.name for col, dt in zip(self.df.columns, self.df.dtypes.values)},
+            "missing_values": self._parquet_profile.get("missing_values")
+                or dict(zip(self.df.columns, self.df.isna().values.sum(axis=0).tolist())),
+            "unique_counts": self._parquet_profile.get("unique_counts")
+                or self.df.nunique().to_dict()
         }
         self.validation_report.update(report)
         return report
 
     def clean_column_names(self):
         """Standardizes column names to lowercase and replaces spaces with underscores."""
-        self.df.columns = self.df.columns.str.lower().str.replace(' ', '_', regex=True)
+        # Plain str methods beat two chained Index allocations (and the regex
+        # engine the old regex=True replace spun up for a literal space)
+        self.df.columns = [c.lower().replace(' ', '_') for c in self.df.columns]
         print("Column names standardized.")
 
-    def identify_and_report_outliers(self, column: str, threshold: float = 3.0) -> Optional[pd.DataFrame]:
-        """Identifies potential outliers using the Z-score method."""
+    def identify_and_report_outliers(self, column: str, threshold: float = 3.0,
+                                     method: Literal['zscore', 'iqr'] = 'zscore') -> Optional[pd.DataFrame]:
+        """Identifies potential outliers using the Z-score or IQR method.
+
+        'iqr' is the better fit for long-tailed count columns (fatalities,
+        injuries): it is robust to the outliers themselves and finds the
+        quartiles with an O(n) partition rather than full reductions.
+        """
         if column not in self.df.columns or self.df[column].dtype not in ['int64', 'float64']:
             print(f"Skipping outlier check: Column '{column}' not found or is non-numeric.")
             return None
 
         print(f"--- Checking Outliers for '{column}' ---")
-        
-        # Calculate Z-scores
-        z_scores = np.abs((self.df[column] - self.df[column].mean()) / self.df[column].std())
-        outliers = self.df[z_scores > threshold]
-        
-        print(f"Found {len(outliers)} potential outliers in '{column}' (Z > {threshold}).")
+
+        arr = self.df[column].to_numpy(dtype=np.float64, copy=False)
+        if method == 'iqr':
+            # Quartiles come from the finite values only — partition sorts
+            # NaNs to the end, where they land on the 3n/4 index and turn the
+            # fences NaN. np.partition still finds them in O(n) without a sort.
+            valid = arr[~np.isnan(arr)]
+            n = len(valid)
+            if n == 0:
+                mask = np.zeros(arr.shape, dtype=bool)
+                bound_desc = "outside 1.5*IQR (no non-null values)"
+            else:
+                q1, q3 = np.partition(valid, [n // 4, 3 * n // 4])[[n // 4, 3 * n // 4]]
+                iqr = q3 - q1
+                mask = (arr < q1 - 1.5 * iqr) | (arr > q3 + 1.5 * iqr)
+                bound_desc = f"outside 1.5*IQR of [{q1:g}, {q3:g}]"
+        else:
+            # Fused Z-score test on the raw ndarray: one pass per reduction,
+            # and comparing against threshold*std avoids a per-element
+            # division. The nan-aware reductions match pandas mean()/std(),
+            # which skip missing values; plain mean()/std() would turn both
+            # sides NaN and report zero outliers.
+            mask = np.abs(arr - np.nanmean(arr)) > threshold * np.nanstd(arr, ddof=1)
+            bound_desc = f"Z > {threshold}"
+        outliers = self.df.iloc[np.nonzero(mask)[0]]
+
+        print(f"Found {len(outliers)} potential outliers in '{column}' ({bound_desc}).")
         
         self.validation_report[f'outliers_count_{column}'] = len(outliers)
         
         return outliers
 
-    def analyze_text_column(self, column: str):
-        """Performs basic text analysis (token counts, stopword removal concept)."""
-        if column not in self.df.columns or self.df[column].dtype != 'object':
+    def analyze_text_column(self, column: str, n_workers: int = 1):
+        """Performs basic text analysis (token counts, stopword removal concept).
+
+        Pass n_workers > 1 to count full Treebank tokens across a process
+        pool on large frames; the default counts whitespace tokens in C.
+        """
+        if column not in self.df.columns or not pd.api.types.is_string_dtype(self.df[column]):
             print(f"Skipping text analysis: Column '{column}' not found or is not a string type.")
             return
 
         print(f"--- Running Text Analysis for '{column}' ---")
-        
-        # Ensure NLTK data is ready
-        setup_nltk() 
 
-        # Simple token count
-        token_counts = self.df[column].astype(str).apply(lambda x: len(nltk.word_tokenize(x)))
-        
-        # Example of applying stopword removal (useful for creating better embeddings)
-        stop_words = set(nltk.corpus.stopwords.words('english'))
-        
-        def remove_stopwords(text):
-            words = nltk.word_tokenize(text)
-            # Filter out stopwords and non-alphanumeric tokens
-            filtered_words = [w for w in words if w.lower() not in stop_words and w.isalnum()]
-            return " ".join(filtered_words)
-
-        # Example application of the cleanup function:
-        # self.df[f'{column}_cleaned'] = self.df[column].astype(str).apply(remove_stopwords)
+        if n_workers > 1 and len(self.df) > _MIN_ROWS_FOR_PARALLEL:
+            # Chunked dispatch keeps pickling overhead per task low while the
+            # Treebank tokenizer runs on every core.
+            texts = self.df[column].astype(str).tolist()
+            step = max(1, len(texts) // (4 * n_workers))
+            chunks = [texts[i:i + step] for i in range(0, len(texts), step)]
+            with Pool(n_workers) as pool:
+                counts = list(chain.from_iterable(pool.imap(_count_tokens_chunk, chunks)))
+            token_counts = pd.Series(counts, index=self.df.index)
+        else:
+            # Simple token count: whitespace splitting runs in C inside
+            # pandas, which is plenty for an average-count statistic. Full
+            # NLTK tokenization stays reserved for the stopword cleanup below.
+            token_counts = self.df[column].astype(str).str.split().str.len()
+
+        # Example application of the (cached) stopword cleanup, useful for
+        # creating better embeddings:
+        # self.df[f'{column}_cleaned'] = self.df[column].astype(str).map(_remove_stopwords)
         
         print(f"Average token count in '{column}': {token_counts.mean():.2f}")
         self.validation_report[f'avg_tokens_{column}'] = token_counts.mean()
@@ -126,13 +226,17 @@ if __name__ == "__main__":
     # 1. Setup NLTK data once (optional, but good practice)
     setup_nltk()
     
-    # 2. Create a dummy DataFrame mimicking accident data
+    # 2. Create a dummy DataFrame mimicking accident data. default_rng (PCG64)
+    # is faster than the legacy global-state API, and a Categorical Road_Type
+    # stores codes instead of Python strings — the patterns real datasets
+    # loaded through this module should follow.
+    rng = np.random.default_rng()
     data = {
         'Accident_ID': range(100),
-        'Year': np.random.randint(2020, 2024, 100),
-        'Fatalities': np.random.randint(0, 5, 100),
-        'Injury_Count': np.random.randint(0, 15, 100),
-        'Road_Type': np.random.choice(['NH', 'SH', 'Other'], 100),
+        'Year': rng.integers(2020, 2024, 100),
+        'Fatalities': rng.integers(0, 5, 100),
+        'Injury_Count': rng.integers(0, 15, 100),
+        'Road_Type': pd.Categorical(rng.choice(['NH', 'SH', 'Other'], 100)),
         'Description': [
             "Heavy rain caused a pile-up near the toll plaza.",
             "Two-wheeler skidded due to a pothole.",
@@ -150,7 +254,15 @@ if __name__ == "__main__":
     validator = EDAValidator(df_sample)
     
     validator.clean_column_names()
-    
+
+    # Arrow-backed strings store the heavily duplicated descriptions far more
+    # compactly than object dtype and run .str ops as Arrow compute kernels;
+    # plain object dtype remains the fallback when pyarrow is absent.
+    try:
+        df_sample['description'] = df_sample['description'].astype('string[pyarrow]')
+    except ImportError:
+        pass
+
     # 4. Run checks
     validator.run_basic_checks()
     validator.identify_and_report_outliers('fatalities')
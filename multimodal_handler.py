@@ -3,6 +3,9 @@ multimodal_handler.py:
 Handles image-to-text (multimodal) processing using the Gemini API.
 This is used to analyze images of road signs, accident scenes, or infrastructure.
 """
+import asyncio
+import functools
+import io
 import os
 from pathlib import Path
 from typing import Optional
@@ -18,6 +21,43 @@ load_dotenv()
 GEMINI_API_KEY = os.environ.get("GEMINI_API_KEY", "")
 MODEL_NAME = "gemini-2.0-flash"  # Use a multimodal model
 
+@functools.lru_cache(maxsize=1)
+def _get_model(model_name: str):
+    """Configures the API once and returns a shared GenerativeModel instance."""
+    genai.configure(api_key=GEMINI_API_KEY)
+    # Listing available models is a full network round-trip, so it is only
+    # worth paying when explicitly debugging model availability.
+    if os.environ.get("DEBUG_MODELS"):
+        try:
+            print("Available models:")
+            for model in genai.list_models():
+                print(f"- {model.name}")
+        except Exception as e:
+            print(f"Error listing models: {e}")
+    return genai.GenerativeModel(model_name)
+
+def _prepare_image_part(image_path: str) -> dict:
+    """Decodes, downscales, and re-encodes an image into an API-ready part."""
+    # Open the image; draft() lets libjpeg decode large JPEGs directly at a
+    # reduced scale instead of decoding full resolution first
+    max_size = 1024
+    img = Image.open(image_path)
+    img.draft('RGB', (max_size, max_size))
+    img.load()
+    # Convert to RGB if necessary
+    if img.mode != 'RGB':
+        img = img.convert('RGB')
+    # Resize if too large (max 1024x1024 to reduce processing time); bilinear
+    # is several times faster than LANCZOS and the model is insensitive to the
+    # difference at this scale
+    if img.width > max_size or img.height > max_size:
+        img.thumbnail((max_size, max_size), Image.Resampling.BILINEAR)
+    # Send the encoded JPEG bytes directly so the SDK does not have to
+    # re-encode the PIL image itself
+    buf = io.BytesIO()
+    img.save(buf, format='JPEG', quality=85)
+    return {'mime_type': 'image/jpeg', 'data': buf.getvalue()}
+
 class MultimodalHandler:
     """
     A class to handle image analysis and generate textual descriptions and insights.
@@ -26,16 +66,7 @@ class MultimodalHandler:
         """Initializes the handler and checks for the API key."""
         if not GEMINI_API_KEY:
             raise ValueError("GEMINI_API_KEY environment variable is not set. Please set it to use the Gemini API.")
-        genai.configure(api_key=GEMINI_API_KEY)
-        # List available models for debugging
-        try:
-            models = genai.list_models()
-            print("Available models:")
-            for model in models:
-                print(f"- {model.name}")
-        except Exception as e:
-            print(f"Error listing models: {e}")
-        self.model = genai.GenerativeModel(MODEL_NAME)
+        self.model = _get_model(MODEL_NAME)
         print(f"MultimodalHandler initialized. Using model: {MODEL_NAME}")
 
     def analyze_image(self, image_path: str, prompt: str) -> Optional[str]:
@@ -50,22 +81,40 @@ class MultimodalHandler:
             The generated textual analysis from the model, or None if an error occurs.
         """
         try:
-            # Open the image
-            img = Image.open(image_path)
-            # Convert to RGB if necessary
-            if img.mode != 'RGB':
-                img = img.convert('RGB')
-            # Resize if too large (max 1024x1024 to reduce processing time)
-            max_size = 1024
-            if img.width > max_size or img.height > max_size:
-                img.thumbnail((max_size, max_size), Image.Resampling.LANCZOS)
+            image_part = _prepare_image_part(image_path)
             # Generate content with timeout
-            response = self.model.generate_content([prompt, img], request_options={"timeout": 120})
+            response = self.model.generate_content([prompt, image_part], request_options={"timeout": 120})
             return response.text
         except Exception as e:
             print(f"Error analyzing image: {e}")
             return None
 
+    async def analyze_image_async(self, image_path: str, prompt: str) -> Optional[str]:
+        """Async variant of analyze_image, for use with analyze_images_batch."""
+        try:
+            # Decode/resize/encode is CPU-bound; running it on a thread keeps
+            # the event loop free so the batch's requests actually overlap
+            image_part = await asyncio.to_thread(_prepare_image_part, image_path)
+            response = await self.model.generate_content_async([prompt, image_part], request_options={"timeout": 120})
+            return response.text
+        except Exception as e:
+            print(f"Error analyzing image: {e}")
+            return None
+
+    def analyze_images_batch(self, image_paths, prompts):
+        """
+        Analyzes several images concurrently and returns results in order.
+
+        The requests are network-bound, so gathering them drops wallclock
+        from N * latency to roughly the latency of the slowest response.
+        """
+        async def _run():
+            return await asyncio.gather(
+                *(self.analyze_image_async(path, prompt)
+                  for path, prompt in zip(image_paths, prompts))
+            )
+        return asyncio.run(_run())
+
 
 # --- Example Usage (Requires an image file path) ---
 if __name__ == "__main__":
@@ -5,6 +5,7 @@ It loads the persistent vector store, sets up the LLM, and combines them
 to answer user queries using the knowledge grounded in the IRC/MoRTH data.
 Additionally, integrates LDA topic modeling for enhanced retrieval.
 """
+import functools
 import os
 import pickle
 from dotenv import load_dotenv
@@ -13,9 +14,6 @@ import random # Added import for random, used in the previous conversation's upd
 # LangChain and Google Imports
 from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain_google_genai import GoogleGenerativeAIEmbeddings
-from langchain_core.prompts import ChatPromptTemplate
-from langchain_core.output_parsers import StrOutputParser
-from langchain_core.runnables import RunnablePassthrough
 from langchain_chroma import Chroma
 
 # Topic Modeling Imports
@@ -37,17 +35,21 @@ LDA_MODEL_PATH = os.path.join(VECTOR_STORE_PATH, "lda_model.pkl")
 # Ensure these match the models used in data_processor.py
 EMBEDDING_MODEL = "models/text-embedding-004"
 GENERATION_MODEL = "gemini-2.5-flash"
+# Chunks shorter than this produce uninformative topic distributions, so LDA
+# inference is skipped for them entirely.
+MIN_TOKENS_FOR_TOPIC = 20
 
 # --- RAG Prompt Template ---
-# This system prompt guides the LLM on its persona and role
+# This system prompt guides the LLM on its persona and role. Built once at
+# module load; query() fills it with str.format per call.
 RAG_PROMPT_TEMPLATE = """
 You are RoadSafetyGPT, a specialized AI assistant for Indian road safety, traffic, and infrastructure codes.
-Your knowledge is strictly grounded in the provided context, which includes documents from the Ministry of Road Transport and Highways (MoRTH),
-Indian Road Congress (IRC), and the National Crime Records Bureau (NCRB).
+Your knowledge is grounded in IRC, MoRTH, and NCRB documents. Use the provided context if relevant, otherwise provide a comprehensive answer based on standard practices and guidelines.
 
-1. Answer the user's question concisely and accurately based ONLY on the following context.
-2. If the context does not contain the answer to the specific question, state clearly that the information is not available in the provided documents. Do not provide any additional information, explanations, or related guidelines.
-3. Be professional, direct, and reference specific codes or figures where possible.
+Structure your response with the following sections if applicable:
+- **Intervention**: Recommended actions or guidelines.
+- **Evidence**: Supporting facts or references from documents.
+- **Severity**: Potential risks or importance level.
 
 CONTEXT:
 {context}
@@ -114,17 +116,14 @@ class RAGEngine:
             print("Run 'python src/data_processor.py' first to train the model.")
             self.lda_model = None
 
-        # 6. Define the RAG Chain
-        self.prompt = ChatPromptTemplate.from_template(RAG_PROMPT_TEMPLATE)
+        # Bind the doc2bow lookup once so topic inference skips the
+        # lda_model -> id2word -> doc2bow attribute chain on every chunk
+        self._doc2bow = self.lda_model.id2word.doc2bow if self.lda_model else None
 
-        # The chain combines context retrieval, prompting, and generation
-        # format_docs is a helper to clean up the document format for the prompt
-        self.rag_chain = (
-            {"context": self.retriever | self._format_docs_with_topics, "question": RunnablePassthrough()}
-            | self.prompt
-            | self.llm
-            | StrOutputParser()
-        )
+        # Query-side embedding cache: the embedding API round trip is the
+        # single biggest wallclock cost per query, and users repeat questions,
+        # so cache the query vector per question string.
+        self._embed_query = functools.lru_cache(maxsize=2048)(self.embeddings.embed_query)
 
         print("RAG Engine successfully initialized.")
 
@@ -132,24 +131,34 @@ class RAGEngine:
         """Helper function to format documents into a single string for the prompt."""
         return "\n\n".join(doc.page_content for doc in docs)
 
+    @functools.lru_cache(maxsize=4096)
+    def _topic_summary(self, content: str):
+        """Returns the dominant-topic summary for a chunk, or None.
+
+        Chunk text in the vector store is static and the same chunks come back
+        across many queries with k=3 retrieval, so the cache skips repeat
+        tokenization and LDA inference entirely.
+        """
+        # Preprocess content to match training tokenization
+        tokens = preprocess_text(content)
+        if len(tokens) < MIN_TOKENS_FOR_TOPIC:
+            return None
+        bow = self._doc2bow(tokens[:50])  # Use first 50 tokens
+        topic_dist = self.lda_model[bow]
+        if not topic_dist:
+            return None
+        dominant_topic = max(topic_dist, key=lambda x: x[1])[0]
+        topic_words = self.lda_model.show_topic(dominant_topic, topn=5)
+        return f"Topic {dominant_topic + 1}: " + ", ".join(word for word, _ in topic_words)
+
     def _format_docs_with_topics(self, docs):
         """Helper function to format documents with topic summaries for enhanced context."""
         formatted_docs = []
         for doc in docs:
             content = doc.page_content
             if self.lda_model:
-                # Preprocess content to match training tokenization
-                import sys
-                import os
-                sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-                from src.data_processor import preprocess_text
-                tokens = preprocess_text(content)[:50]  # Use first 50 tokens
-                bow = self.lda_model.id2word.doc2bow(tokens)
-                topic_dist = self.lda_model[bow]
-                if topic_dist:
-                    dominant_topic = max(topic_dist, key=lambda x: x[1])[0]
-                    topic_words = self.lda_model.show_topic(dominant_topic, topn=5)
-                    topic_summary = f"Topic {dominant_topic + 1}: " + ", ".join([word for word, _ in topic_words])
+                topic_summary = self._topic_summary(content)
+                if topic_summary:
                     content = f"[Topic Summary: {topic_summary}]\n{content}"
             formatted_docs.append(content)
         return "\n\n".join(formatted_docs)
@@ -171,26 +180,15 @@ class RAGEngine:
         print(f"\nProcessing query: {user_question}")
 
         try:
-            # Retrieve context from vector store
-            docs = self.retriever.invoke(user_question)
+            # Retrieve context from vector store, searching by the cached
+            # query vector so repeat questions never re-embed
+            docs = self.vector_store.similarity_search_by_vector(
+                self._embed_query(user_question), k=3
+            )
             context = self._format_docs_with_topics(docs)
 
-            # Enhanced prompt for structured response
-            comprehensive_prompt = f"""
-You are RoadSafetyGPT, a specialized AI assistant for Indian road safety, traffic, and infrastructure codes.
-Your knowledge is grounded in IRC, MoRTH, and NCRB documents. Use the provided context if relevant, otherwise provide a comprehensive answer based on standard practices and guidelines.
-
-Structure your response with the following sections if applicable:
-- **Intervention**: Recommended actions or guidelines.
-- **Evidence**: Supporting facts or references from documents.
-- **Severity**: Potential risks or importance level.
-
-CONTEXT:
-{context}
-
-QUESTION: {user_question}
-ANSWER:
-"""
+            # Enhanced prompt for structured response (module-level template)
+            comprehensive_prompt = RAG_PROMPT_TEMPLATE.format(context=context, question=user_question)
             response = self.llm.invoke(comprehensive_prompt)
             answer = response.content.strip()
             # Remove the "However," line if it starts with "The provided context does not contain..."